@@ -1,22 +1,49 @@
 """
 Required tools for fastapi, db and hashing
 """
-from hashlib import md5
-from typing import List
+import asyncio
+import logging
+import os
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from hashlib import sha256
+from itertools import chain
+from typing import Dict, List, NamedTuple, Optional, Set
 from fastapi import FastAPI, HTTPException, Depends
-from sqlmodel import SQLModel, Session, create_engine, select, Field
+from sqlalchemy import bindparam, event
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+from sqlmodel import SQLModel, select, Field
+from sqlmodel.ext.asyncio.session import AsyncSession
 from pydantic import BaseModel
 
+logger = logging.getLogger(__name__)
+
 # Database setup
-DATABASE_URL = "sqlite:///./cache.db"
-engine = create_engine(DATABASE_URL, echo=True)
+DATABASE_URL = "sqlite+aiosqlite:///./cache.db"
+# SQL statement logging is costly per query, so it is opt-in via SQL_ECHO
+SQL_ECHO = os.getenv("SQL_ECHO", "").lower() in ("1", "true", "yes")
+engine = create_async_engine(DATABASE_URL, echo=SQL_ECHO)
+
+@event.listens_for(engine.sync_engine, "connect")
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    """
+    Configures each new SQLite connection for concurrent access: WAL journaling lets readers
+    proceed alongside a writer, and synchronous=NORMAL avoids an fsync on every commit.
+    """
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.execute("PRAGMA mmap_size=268435456")
+    cursor.close()
 
 class CachedResult(SQLModel, table=True):
     """
     Model to store cached transformed results to avoid redundant computation.
     """
     id: int = Field(default=None, primary_key=True)
-    input_string: str
+    input_string: str = Field(index=True, unique=True)
     transformed_string: str
 
 class Payload(SQLModel, table=True):
@@ -24,22 +51,110 @@ class Payload(SQLModel, table=True):
     Model to store final processed payloads identified by a unique hash.
     """
     id: int = Field(default=None, primary_key=True)
-    identifier: str
+    identifier: str = Field(index=True, unique=True)
     output: str
 
-# Create database tables
-SQLModel.metadata.create_all(engine)
+# Statements are built once and reused so SQLAlchemy does not rebuild them per request
+SELECT_CACHED_RESULTS = select(CachedResult).where(
+    CachedResult.input_string.in_(bindparam("input_strings", expanding=True))
+)
+INSERT_CACHED_RESULT = insert(CachedResult).on_conflict_do_nothing(index_elements=["input_string"])
+SELECT_PAYLOAD = select(Payload).where(Payload.identifier == bindparam("identifier"))
+SELECT_PAYLOAD_ID = select(Payload.id).where(Payload.identifier == bindparam("identifier"))
+INSERT_PAYLOAD = insert(Payload).on_conflict_do_nothing(index_elements=["identifier"])
 
-def get_session():
+async def get_session():
     """
-    Dependency function to provide a database session.
+    Dependency function to provide an asynchronous database session.
     """
-    with Session(engine) as session:
+    async with AsyncSession(engine) as session:
         yield session
 
+class CachedResultWriter:
+    """
+    Background writer that collects new CachedResult rows from many requests and stores
+    them in batches, so a single commit covers many inserts.
+    """
+    def __init__(self, engine: AsyncEngine, flush_interval: float = 0.01, max_batch_size: int = 1000):
+        self.engine = engine
+        self.flush_interval = flush_interval
+        self.max_batch_size = max_batch_size
+        self.queue: Optional[asyncio.Queue] = None
+        self.task: Optional[asyncio.Task] = None
+    
+    def start(self) -> None:
+        """
+        Starts the background task; must be called from within the running event loop.
+        """
+        self.queue = asyncio.Queue()
+        self.task = asyncio.create_task(self._run())
+    
+    async def stop(self) -> None:
+        """
+        Flushes all queued rows and stops the background task.
+        """
+        await self.queue.put(None)
+        await self.task
+    
+    def put(self, transformations: Dict[str, str]) -> None:
+        """
+        Queues transformations to be stored in the next batch.
+        
+        Args:
+            transformations (Dict[str, str]): Mapping of input strings to transformed strings.
+        """
+        for input_string, transformed_string in transformations.items():
+            self.queue.put_nowait({"input_string": input_string, "transformed_string": transformed_string})
+    
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            batch = []
+            row = await self.queue.get()
+            deadline = loop.time() + self.flush_interval
+            while True:
+                if row is None:
+                    stopping = True
+                    break
+                batch.append(row)
+                remaining = deadline - loop.time()
+                if len(batch) >= self.max_batch_size or remaining <= 0:
+                    break
+                try:
+                    row = await asyncio.wait_for(self.queue.get(), remaining)
+                except asyncio.TimeoutError:
+                    break
+            if batch:
+                await self._write(batch)
+    
+    async def _write(self, batch: List[Dict[str, str]]) -> None:
+        try:
+            async with AsyncSession(self.engine) as session:
+                await session.exec(INSERT_CACHED_RESULT, params=batch)
+                await session.commit()
+        except Exception:
+            # The rows stay in the in-process cache and are re-queued on their next database miss
+            logger.exception("Failed to store %d cached results", len(batch))
+
+cache_writer = CachedResultWriter(engine)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Creates the database tables and starts the cached result writer when the application
+    starts; flushes pending writes and closes pooled connections when it stops.
+    """
+    async with engine.begin() as connection:
+        await connection.run_sync(SQLModel.metadata.create_all)
+    cache_writer.start()
+    yield
+    await cache_writer.stop()
+    await engine.dispose()
+
 
 # Initialize FastAPI application
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 # Transformer function (Simulating an external service)
 def transformer_function(input_string: str) -> str:
@@ -57,77 +172,179 @@ class PayloadRequest(BaseModel):
     list_1: List[str]
     list_2: List[str]
 
+# Response Models
+class PayloadIdentifierResponse(BaseModel):
+    """
+    Response model for the /payload endpoint.
+    """
+    identifier: str
+
+class PayloadOutputResponse(BaseModel):
+    """
+    Response model for the /payload/{identifier} endpoint.
+    """
+    output: str
+
+class Transformation(NamedTuple):
+    """
+    A transformed string kept together with its UTF-8 encoding, so cache hits can be
+    hashed without encoding them again.
+    """
+    text: str
+    encoded: bytes
+
+# In-process LRU cache of transformations, consulted before the database
+TRANSFORMATION_CACHE_SIZE = 100_000
+transformation_cache: "OrderedDict[str, Transformation]" = OrderedDict()
+
+def remember_transformations(transformations: Dict[str, Transformation]) -> None:
+    """
+    Stores transformations in the in-process LRU cache, evicting the least recently used
+    entries once it grows beyond TRANSFORMATION_CACHE_SIZE.
+    
+    Args:
+        transformations (Dict[str, Transformation]): Mapping of input strings to transformations.
+    """
+    transformation_cache.update(transformations)
+    for input_string in transformations:
+        transformation_cache.move_to_end(input_string)
+    while len(transformation_cache) > TRANSFORMATION_CACHE_SIZE:
+        transformation_cache.popitem(last=False)
+
+def recall_transformations(input_strings: Set[str]) -> Dict[str, Transformation]:
+    """
+    Looks up transformations in the in-process LRU cache, marking each hit as recently used.
+    
+    Args:
+        input_strings (Set[str]): The distinct input strings to look up.
+    
+    Returns:
+        Dict[str, Transformation]: Mapping of the input strings found in the cache.
+    """
+    cache = {}
+    for input_string in input_strings:
+        transformation = transformation_cache.get(input_string)
+        if transformation is not None:
+            transformation_cache.move_to_end(input_string)
+            cache[input_string] = transformation
+    return cache
+
 # Caching function
-def get_or_cache_transformation(input_string: str, session: Session) -> str:
+async def get_or_cache_transformations(
+    input_strings: Set[str], session: AsyncSession
+) -> Dict[str, Transformation]:
+    """
+    Retrieves cached transformations for strings missing from the in-process cache with a
+    single database query; any strings not yet cached are transformed, queued for the
+    background writer, and included in the result. All results are remembered in memory.
+    
+    Args:
+        input_strings (Set[str]): The distinct input strings to be transformed.
+        session (AsyncSession): Database session for querying cached results.
+    
+    Returns:
+        Dict[str, Transformation]: Mapping of each input string to its transformation.
+    """
+    rows = (await session.exec(SELECT_CACHED_RESULTS, params={"input_strings": list(input_strings)})).all()
+    found = {row.input_string: row.transformed_string for row in rows}
+    missing = input_strings - found.keys()
+    if missing:
+        transformed = {s: transformer_function(s) for s in missing}
+        cache_writer.put(transformed)
+        found.update(transformed)
+    transformations = {s: Transformation(t, t.encode()) for s, t in found.items()}
+    remember_transformations(transformations)
+    return transformations
+
+# Payloads larger than this many bytes are hashed in a worker thread to keep the event loop free
+HASH_OFFLOAD_THRESHOLD = 256 * 1024
+
+# Identifier function
+def compute_identifier(encoded_1: List[bytes], encoded_2: List[bytes]) -> str:
     """
-    Retrieves a cached transformation if it exists; otherwise, applies the transformation,
-    caches it, and returns the result.
+    Hashes the interleaved, comma-separated transformed strings incrementally, producing the
+    same digest as hashing the joined output without building it in memory.
     
     Args:
-        input_string (str): The input string to be transformed.
-        session (Session): Database session for querying and storing cached results.
+        encoded_1 (List[bytes]): UTF-8 encoded transformed strings from the first list.
+        encoded_2 (List[bytes]): UTF-8 encoded transformed strings from the second list.
     
     Returns:
-        str: The transformed string.
+        str: The first 32 hex characters of the SHA-256 digest identifying the payload.
     """
-    existing_entry = session.exec(select(CachedResult).where(CachedResult.input_string == input_string)).first()
-    if existing_entry:
-        return existing_entry.transformed_string
-    transformed_string = transformer_function(input_string)
-    new_entry = CachedResult(input_string=input_string, transformed_string=transformed_string)
-    session.add(new_entry)
-    session.commit()
-    return transformed_string
+    hasher = sha256()
+    separator = b", "
+    for index, (first, second) in enumerate(zip(encoded_1, encoded_2)):
+        if index:
+            hasher.update(separator)
+        hasher.update(first)
+        hasher.update(separator)
+        hasher.update(second)
+    return hasher.hexdigest()[:32]
 
 @app.post("/payload")
-def create_payload(request: PayloadRequest, session: Session = Depends(get_session)):
+async def create_payload(
+    request: PayloadRequest, session: AsyncSession = Depends(get_session)
+) -> PayloadIdentifierResponse:
     """
     Creates and stores a new payload based on transformed input lists.
     
     Args:
         request (PayloadRequest): Contains two equal-length lists of strings to be processed.
-        session (Session): Database session for storing and retrieving results.
+        session (AsyncSession): Database session for storing and retrieving results.
     
     Raises:
         HTTPException: If the two lists are not of the same length.
     
     Returns:
-        dict: A dictionary containing the unique identifier of the processed payload.
+        PayloadIdentifierResponse: The unique identifier of the processed payload.
     """
     if len(request.list_1) != len(request.list_2):
         raise HTTPException(status_code=400, detail="Lists must be of the same length.")
     
-    transformed_1 = [get_or_cache_transformation(s, session) for s in request.list_1]
-    transformed_2 = [get_or_cache_transformation(s, session) for s in request.list_2]
-    
-    interleaved_result = ", ".join(sum(zip(transformed_1, transformed_2), ()))
-    identifier = md5(interleaved_result.encode()).hexdigest()
+    input_strings = set(request.list_1) | set(request.list_2)
+    cache = recall_transformations(input_strings)
+    missing = input_strings - cache.keys()
+    if missing:
+        cache.update(await get_or_cache_transformations(missing, session))
+    transformed_1 = [cache[s].text for s in request.list_1]
+    transformed_2 = [cache[s].text for s in request.list_2]
+    encoded_1 = [cache[s].encoded for s in request.list_1]
+    encoded_2 = [cache[s].encoded for s in request.list_2]
+    if sum(map(len, encoded_1)) + sum(map(len, encoded_2)) > HASH_OFFLOAD_THRESHOLD:
+        identifier = await asyncio.to_thread(compute_identifier, encoded_1, encoded_2)
+    else:
+        identifier = compute_identifier(encoded_1, encoded_2)
     
-    existing_payload = session.exec(select(Payload).where(Payload.identifier == identifier)).first()
-    if existing_payload:
-        return {"identifier": existing_payload.identifier}
+    # Fully cached requests usually repeat an earlier payload, so check for it read-only first
+    if not missing:
+        existing_payload = (await session.exec(SELECT_PAYLOAD_ID, params={"identifier": identifier})).first()
+        if existing_payload is not None:
+            return PayloadIdentifierResponse(identifier=identifier)
     
-    new_payload = Payload(identifier=identifier, output=interleaved_result)
-    session.add(new_payload)
-    session.commit()
-    return {"identifier": identifier}
+    interleaved_result = ", ".join(chain.from_iterable(zip(transformed_1, transformed_2)))
+    await session.exec(INSERT_PAYLOAD, params={"identifier": identifier, "output": interleaved_result})
+    await session.commit()
+    return PayloadIdentifierResponse(identifier=identifier)
 
 @app.get("/payload/{identifier}")
-def read_payload(identifier: str, session: Session = Depends(get_session)):
+async def read_payload(
+    identifier: str, session: AsyncSession = Depends(get_session)
+) -> PayloadOutputResponse:
     """
     Retrieves a stored payload based on its unique identifier.
     
     Args:
         identifier (str): Unique hash identifier of the payload.
-        session (Session): Database session for querying stored payloads.
+        session (AsyncSession): Database session for querying stored payloads.
     
     Raises:
         HTTPException: If the payload with the given identifier is not found.
     
     Returns:
-        dict: A dictionary containing the stored output.
+        PayloadOutputResponse: The stored output.
     """
-    payload = session.exec(select(Payload).where(Payload.identifier == identifier)).first()
+    payload = (await session.exec(SELECT_PAYLOAD, params={"identifier": identifier})).first()
     if not payload:
         raise HTTPException(status_code=404, detail="Payload not found.")
-    return {"output": payload.output}
+    return PayloadOutputResponse(output=payload.output)
@@ -1,26 +1,40 @@
+import time
 import pytest
+from hashlib import sha256
 from fastapi.testclient import TestClient
-from sqlmodel import SQLModel, Session, create_engine
-from fast_api import app, get_session, CachedResult, Payload
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlmodel import SQLModel, Session, create_engine, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from fast_api import app, get_session, cache_writer, transformation_cache, CachedResult, Payload
 
 # Test database setup
-test_database_url = "sqlite:///./test_cache.db"
-test_engine = create_engine(test_database_url, echo=True)
-SQLModel.metadata.create_all(test_engine)
+test_database_url = "sqlite+aiosqlite:///./test_cache.db"
+test_engine = create_async_engine(test_database_url, echo=True)
+sync_test_engine = create_engine("sqlite:///./test_cache.db")
+SQLModel.metadata.create_all(sync_test_engine)
 
-def get_test_session():
+async def get_test_session():
     """
     Provides a session connected to the test database.
     """
-    with Session(test_engine) as session:
+    async with AsyncSession(test_engine) as session:
         yield session
 
-# Override the dependency in FastAPI app
+# Override the dependency in FastAPI app and point the background writer at the test database
 app.dependency_overrides[get_session] = get_test_session
+cache_writer.engine = test_engine
 
 # Create a test client
 client = TestClient(app)
 
+@pytest.fixture(scope="module", autouse=True)
+def run_lifespan():
+    """
+    Runs the application lifespan so the background cache writer is active during the tests.
+    """
+    with client:
+        yield
+
 def test_create_payload_success():
     """
     Tests successful creation of a payload with valid input lists.
@@ -33,6 +47,19 @@ def test_create_payload_success():
     assert response.status_code == 200
     assert "identifier" in response.json()
 
+def test_create_payload_repeated_request():
+    """
+    Tests that posting the same lists twice returns the same identifier.
+    """
+    payload_data = {
+        "list_1": ["same", "lists"],
+        "list_2": ["posted", "twice"]
+    }
+    first_response = client.post("/payload", json=payload_data)
+    second_response = client.post("/payload", json=payload_data)
+    assert second_response.status_code == 200
+    assert second_response.json()["identifier"] == first_response.json()["identifier"]
+
 def test_create_payload_mismatched_lists():
     """
     Tests failure case where input lists have different lengths.
@@ -60,6 +87,85 @@ def test_read_existing_payload():
     assert response.status_code == 200
     assert "output" in response.json()
 
+def test_read_payload_with_repeated_strings():
+    """
+    Tests that strings repeated across both lists are transformed and interleaved correctly.
+    """
+    payload_data = {
+        "list_1": ["repeat", "once", "repeat"],
+        "list_2": ["once", "repeat", "repeat"]
+    }
+    create_response = client.post("/payload", json=payload_data)
+    identifier = create_response.json()["identifier"]
+    
+    response = client.get(f"/payload/{identifier}")
+    assert response.status_code == 200
+    assert response.json()["output"] == "REPEAT, ONCE, ONCE, REPEAT, REPEAT, REPEAT"
+
+def test_identifier_matches_output_digest():
+    """
+    Tests that the identifier is the digest of the stored interleaved output.
+    """
+    payload_data = {
+        "list_1": ["digest", "of"],
+        "list_2": ["the", "output"]
+    }
+    identifier = client.post("/payload", json=payload_data).json()["identifier"]
+    
+    output = client.get(f"/payload/{identifier}").json()["output"]
+    assert output == "DIGEST, THE, OF, OUTPUT"
+    assert identifier == sha256(output.encode()).hexdigest()[:32]
+
+def test_identifier_matches_output_digest_for_large_payload():
+    """
+    Tests that large payloads, which are hashed off the event loop, get the same identifier scheme.
+    """
+    payload_data = {
+        "list_1": ["a" * 200_000],
+        "list_2": ["b" * 200_000]
+    }
+    identifier = client.post("/payload", json=payload_data).json()["identifier"]
+    
+    output = client.get(f"/payload/{identifier}").json()["output"]
+    assert output == "A" * 200_000 + ", " + "B" * 200_000
+    assert identifier == sha256(output.encode()).hexdigest()[:32]
+
+def test_transformations_kept_in_memory():
+    """
+    Tests that transformed strings are kept in the in-process cache after a request.
+    """
+    payload_data = {
+        "list_1": ["memory"],
+        "list_2": ["cache"]
+    }
+    response = client.post("/payload", json=payload_data)
+    assert response.status_code == 200
+    assert transformation_cache["memory"] == ("MEMORY", b"MEMORY")
+    assert transformation_cache["cache"] == ("CACHE", b"CACHE")
+
+def test_transformations_written_to_database():
+    """
+    Tests that new transformations are persisted by the background writer.
+    """
+    payload_data = {
+        "list_1": ["written"],
+        "list_2": ["behind"]
+    }
+    response = client.post("/payload", json=payload_data)
+    assert response.status_code == 200
+    
+    statement = select(CachedResult).where(CachedResult.input_string.in_(["written", "behind"]))
+    for _ in range(100):
+        with Session(sync_test_engine) as session:
+            rows = session.exec(statement).all()
+        if len(rows) == 2:
+            break
+        time.sleep(0.01)
+    assert {row.input_string: row.transformed_string for row in rows} == {
+        "written": "WRITTEN",
+        "behind": "BEHIND"
+    }
+
 def test_read_nonexistent_payload():
     """
     Tests retrieval of a non-existent payload.